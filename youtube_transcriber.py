@@ -1,117 +1,236 @@
+import functools
 import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Optional
+from typing import Optional, Union
+import ctranslate2
 import ffmpeg
-import whisper
-from pytube import YouTube
+import numpy as np
+from faster_whisper import BatchedInferencePipeline, WhisperModel
+from yt_dlp import YoutubeDL
+from yt_dlp.utils import DownloadCancelled
+from youtube_utils import get_video_id
 from tqdm import tqdm
 
+# Whisper models expect 16 kHz mono input
+SAMPLE_RATE = 16000
+
+# Downloads are network-bound, so several can run at once
+MAX_DOWNLOAD_WORKERS = 8
+
+# Decoded videos held in memory at once, including the one being transcribed.
+# Further downloads wait, still compressed, until a slot frees up.
+DOWNLOAD_QUEUE_SIZE = 2
+
+# Minimum seconds between download progress updates
+PROGRESS_INTERVAL = 0.1
+
+# CPU cores left for ffmpeg decodes and downloads running alongside transcription
+DOWNLOAD_CPU_HEADROOM = 2
+
+# CTranslate2's own default number of CPU threads
+CTRANSLATE2_DEFAULT_THREADS = 4
+
 class VideoDownloader:
     """Handles downloading YouTube videos and extracting audio."""
     
     def __init__(self, output_dir: str = "downloads"):
         self.output_dir = Path(output_dir)
         self.output_dir.mkdir(exist_ok=True)
+        self._last_progress_time = 0.0
+        self._cancelled = threading.Event()
+    
+    @property
+    def cancelled(self) -> bool:
+        """Whether cancel() has been called."""
+        return self._cancelled.is_set()
+    
+    def cancel(self) -> None:
+        """Abort in-progress downloads and refuse new ones."""
+        self._cancelled.set()
     
-    def download_audio(self, url: str) -> Optional[Path]:
+    def download_audio(self, url: str) -> Optional[tuple[np.ndarray, Path]]:
         """
-        Downloads audio from YouTube video and converts to WAV format.
+        Downloads audio from YouTube video and decodes it to 16 kHz mono PCM.
         
         Args:
             url: YouTube video URL
             
         Returns:
-            Path to converted audio file or None if failed
+            Tuple of (float32 audio samples, path the audio was downloaded to)
+            or None if failed. The downloaded file itself is removed after decoding.
         """
-        try:
-            # Configure YouTube with custom headers
-            yt = YouTube(
-                url,
-                on_progress_callback=self._progress_callback,
-                use_oauth=False
-            )
-            
-            # Try different stream selection approaches
-            audio_stream = None
-            
-            try:
-                # First attempt: Try getting audio-only stream with highest quality
-                audio_stream = yt.streams.filter(only_audio=True).order_by('abr').desc().first()
-                
-                # Second attempt: Try getting any audio stream
-                if not audio_stream:
-                    audio_stream = yt.streams.filter(only_audio=True).first()
-                
-                # Third attempt: Try getting the lowest quality stream that has audio
-                if not audio_stream:
-                    audio_stream = yt.streams.filter(progressive=True).order_by('resolution').first()
-                
-            except Exception as stream_error:
-                print(f"Stream selection error: {stream_error}")
-                # Final attempt: Try getting any available stream
-                audio_stream = yt.streams.first()
-            
-            if not audio_stream:
-                raise ValueError("No suitable audio stream found")
-                
-            # Download audio
-            print(f"Downloading audio using stream: {audio_stream.itag}")
-            audio_file = audio_stream.download(output_path=str(self.output_dir))
-            downloaded_path = Path(audio_file)
-            
-            # Convert to WAV format for better compatibility with Whisper
-            wav_path = downloaded_path.with_suffix('.wav')
-            print("Converting audio format...")
-            self._convert_to_wav(downloaded_path, wav_path)
+        downloaded_path = self.download(url)
+        if not downloaded_path:
+            return None
+        audio = self.decode(downloaded_path)
+        if audio is None:
+            return None
+        return audio, downloaded_path
+    
+    def download(self, url: str) -> Optional[Path]:
+        """
+        Downloads the audio stream of a YouTube video.
+        
+        Args:
+            url: YouTube video URL
             
-            # Remove the original file
-            downloaded_path.unlink()
+        Returns:
+            Path to the downloaded (still compressed) audio file or None if failed
+        """
+        if self.cancelled:
+            return None
+        try:
+            options = {
+                # Prefer audio-only streams, fall back to any stream with audio
+                "format": "bestaudio[ext=m4a]/bestaudio/best",
+                "outtmpl": str(self.output_dir / "%(id)s.%(ext)s"),
+                # Only the linked video, even when the URL also has a list= parameter
+                "noplaylist": True,
+                # Fetch fragmented streams over parallel connections
+                "concurrent_fragment_downloads": 8,
+                "progress_hooks": [self._progress_hook],
+                "quiet": True,
+                "noprogress": True,
+            }
             
-            return wav_path
+            with YoutubeDL(options) as ydl:
+                info = ydl.extract_info(url, download=True)
+                downloaded_path = Path(ydl.prepare_filename(info))
+            print(f"\nDownloaded audio using format: {info.get('format_id')}")
+            return downloaded_path
             
+        except DownloadCancelled:
+            print(f"\nDownload cancelled: {url}")
+            return None
         except Exception as e:
-            print(f"Error downloading/converting video: {str(e)}")
+            print(f"Error downloading video: {str(e)}")
             if "HTTP Error 400" in str(e):
                 print("This might be due to regional restrictions or age verification requirements.")
             elif "HTTP Error 403" in str(e):
                 print("Access forbidden. This might be due to YouTube's security measures.")
             print("\nTroubleshooting steps:")
-            print("1. Try updating pytube: pip install --upgrade pytube")
+            print("1. Try updating yt-dlp: pip install --upgrade yt-dlp")
             print("2. Check if the video is available in your region")
             print("3. Check if the video requires age verification")
             print("4. Try using a different video URL")
             return None
     
-    def _convert_to_wav(self, input_path: Path, output_path: Path) -> None:
-        """Convert audio file to WAV format using ffmpeg."""
+    def decode(self, downloaded_path: Path) -> Optional[np.ndarray]:
+        """
+        Decodes a downloaded audio file to 16 kHz mono PCM and removes the file.
+        
+        Args:
+            downloaded_path: Path returned by download()
+            
+        Returns:
+            Float32 audio samples or None if failed
+        """
+        try:
+            # Decode straight to the PCM format Whisper consumes
+            print("Decoding audio...")
+            return self._decode_audio(downloaded_path)
+        except ffmpeg.Error:
+            return None
+        finally:
+            # Remove the original file
+            downloaded_path.unlink(missing_ok=True)
+    
+    def _decode_audio(self, input_path: Path) -> np.ndarray:
+        """Decode audio file to 16 kHz mono float32 samples using ffmpeg."""
         try:
             stream = ffmpeg.input(str(input_path))
-            stream = ffmpeg.output(stream, str(output_path))
-            ffmpeg.run(stream, capture_stdout=True, capture_stderr=True)
+            stream = ffmpeg.output(stream, "-", format="s16le", acodec="pcm_s16le", ac=1, ar=SAMPLE_RATE)
+            out, _ = ffmpeg.run(stream, capture_stdout=True, capture_stderr=True)
         except ffmpeg.Error as e:
-            print(f"Error converting audio: {str(e.stderr.decode())}")
+            print(f"Error decoding audio: {str(e.stderr.decode())}")
             raise
+        return np.frombuffer(out, np.int16).astype(np.float32) / 32768.0
     
-    @staticmethod
-    def _progress_callback(stream, chunk, bytes_remaining):
-        """Callback to show download progress."""
-        total_size = stream.filesize
-        bytes_downloaded = total_size - bytes_remaining
-        percentage = (bytes_downloaded / total_size) * 100
-        print(f"\rDownload Progress: {percentage:.1f}%", end="")
+    def _progress_hook(self, status: dict) -> None:
+        """Hook to show download progress, rate-limited to PROGRESS_INTERVAL."""
+        if self.cancelled:
+            # Raising from a progress hook is how yt-dlp aborts a download
+            raise DownloadCancelled()
+        # Several downloads share the terminal, so label each update
+        video_id = status.get("info_dict", {}).get("id", "?")
+        if status["status"] == "finished":
+            print(f"\r[{video_id}] Download Progress: 100.0%", end="")
+            return
+        if status["status"] != "downloading":
+            return
+        now = time.monotonic()
+        if now - self._last_progress_time < PROGRESS_INTERVAL:
+            return
+        self._last_progress_time = now
+        total_size = status.get("total_bytes") or status.get("total_bytes_estimate")
+        if not total_size:
+            return
+        percentage = (status["downloaded_bytes"] / total_size) * 100
+        print(f"\r[{video_id}] Download Progress: {percentage:.1f}%", end="")
+
+def _default_cpu_threads() -> int:
+    """
+    Threads for CPU transcription.
+    
+    On machines with more cores than CTranslate2's default, use them, minus
+    some headroom for the download stage; never go below the default.
+    """
+    try:
+        # Respects CPU affinity (taskset, container cpusets); Linux only
+        available = len(os.sched_getaffinity(0))
+    except AttributeError:
+        available = os.cpu_count() or 1
+    return max(min(CTRANSLATE2_DEFAULT_THREADS, available), available - DOWNLOAD_CPU_HEADROOM)
+
+@functools.lru_cache(maxsize=4)
+def _load_model(model_size: str, device: str, compute_type: str, cpu_threads: int) -> WhisperModel:
+    """Load a Whisper model once and share it across Transcriber instances."""
+    return WhisperModel(model_size, device=device, compute_type=compute_type, cpu_threads=cpu_threads)
 
 class Transcriber:
-    """Handles audio transcription using Whisper."""
+    """Handles audio transcription using Whisper (faster-whisper backend)."""
     
-    def __init__(self, model_size: str = "base"):
-        self.model = whisper.load_model(model_size)
+    def __init__(
+        self,
+        model_size: str = "base",
+        device: Optional[str] = None,
+        batch_size: int = 16,
+        cpu_threads: Optional[int] = None
+    ):
+        """
+        Initialize the Transcriber and load the Whisper model.
+        
+        Args:
+            model_size: Whisper model size (tiny, base, small, medium, large)
+            device: Device to run on ("cuda" or "cpu").
+                Defaults to CUDA when available, otherwise CPU.
+            batch_size: Number of VAD-segmented chunks decoded per forward pass
+            cpu_threads: Threads used by the CPU kernels. Defaults to the cores
+                available to this process minus DOWNLOAD_CPU_HEADROOM, but never
+                fewer than CTranslate2's default of 4 (or the available cores).
+        """
+        if device is None:
+            device = "cuda" if ctranslate2.get_cuda_device_count() > 0 else "cpu"
+        self.device = device
+        # int8 weights everywhere; fp16 activations are only supported on GPU
+        self.compute_type = "int8_float16" if device == "cuda" else "int8"
+        self.batch_size = batch_size
+        if cpu_threads is None:
+            cpu_threads = _default_cpu_threads() if device == "cpu" else 0
+        self.model = _load_model(model_size, device, self.compute_type, cpu_threads)
+        # Splits audio on speech boundaries and decodes the chunks in batches
+        self.pipeline = BatchedInferencePipeline(model=self.model)
     
-    def transcribe(self, audio_path: Path, output_path: Optional[Path] = None) -> Optional[str]:
+    def transcribe(self, audio: Union[np.ndarray, Path], output_path: Optional[Path] = None) -> Optional[str]:
         """
-        Transcribes audio file to text.
+        Transcribes audio to text.
         
         Args:
-            audio_path: Path to audio file
+            audio: 16 kHz mono float32 samples or path to audio file
             output_path: Optional path to save transcript
             
         Returns:
@@ -119,10 +238,17 @@ class Transcriber:
         """
         try:
             print("\nTranscribing audio...")
-            result = self.model.transcribe(str(audio_path))
-            transcript = result["text"]
+            if isinstance(audio, Path):
+                audio = str(audio)
+            segments, info = self.pipeline.transcribe(
+                audio, beam_size=5, vad_filter=True, batch_size=self.batch_size
+            )
+            # Segments are generated lazily; joining them runs the decoding
+            transcript = "".join(segment.text for segment in segments).strip()
             
-            if output_path:
+            # An empty transcript (e.g. no speech detected) is not saved, so a
+            # later run does not mistake it for a finished one
+            if output_path and transcript:
                 with open(output_path, "w", encoding="utf-8") as f:
                     f.write(transcript)
                 print(f"Transcript saved to: {output_path}")
@@ -136,39 +262,99 @@ class Transcriber:
 def main():
     """Main function to run the transcription process."""
     try:
-        # Read URL from url.txt
+        # Read URLs from url.txt, one per line
         with open('url.txt', 'r') as file:
-            url = file.read().strip()
+            urls = [line.strip() for line in file if line.strip()]
             
-        if not url:
+        if not urls:
             print("Error: url.txt is empty")
             return
             
-        print(f"Processing URL: {url}")
+        print(f"Processing {len(urls)} URL(s)")
         
         # Initialize components
         downloader = VideoDownloader()
         transcriber = Transcriber()
         
-        # Download audio
-        audio_path = downloader.download_audio(url)
-        if not audio_path:
-            return
+        # Skip videos that already have a transcript from a previous run
+        pending_urls = []
+        for url in urls:
+            try:
+                video_id = get_video_id(url)
+            except ValueError as e:
+                # A malformed line only skips that URL, not the whole batch
+                print(f"Skipping {url}: {str(e)}")
+                continue
+            transcript_path = downloader.output_dir / f"{video_id}.txt"
+            if transcript_path.exists() and transcript_path.stat().st_size > 0:
+                print(f"Transcript already exists for {url}: {transcript_path}")
+            else:
+                pending_urls.append(url)
         
-        # Create output path for transcript
-        transcript_path = audio_path.with_suffix(".txt")
+        # Download on a thread pool so transcription of one video overlaps
+        # with downloading the next ones. Every task puts exactly one item.
+        downloads = queue.Queue()
+        decode_slots = threading.Semaphore(DOWNLOAD_QUEUE_SIZE)
         
-        # Transcribe audio
-        transcript = transcriber.transcribe(audio_path, transcript_path)
-        if transcript:
-            print("\nTranscription completed successfully!")
-            print("\nTranscript preview:")
-            print(transcript[:500] + "..." if len(transcript) > 500 else transcript)
+        def download_and_decode(url):
+            downloaded_path = downloader.download(url)
+            if not downloaded_path:
+                return None
+            # Hold a slot until the transcriber is done with this audio
+            while not decode_slots.acquire(timeout=0.5):
+                if downloader.cancelled:
+                    downloaded_path.unlink(missing_ok=True)
+                    return None
+            audio = downloader.decode(downloaded_path)
+            if audio is None:
+                decode_slots.release()
+                return None
+            return audio, downloaded_path
+        
+        def download_to_queue(url):
+            download = None
+            try:
+                download = download_and_decode(url)
+            finally:
+                downloads.put((url, download))
+        
+        executor = ThreadPoolExecutor(max_workers=MAX_DOWNLOAD_WORKERS)
+        try:
+            for url in pending_urls:
+                executor.submit(download_to_queue, url)
+            
+            # Transcribe sequentially; all videos share the one loaded model
+            for _ in pending_urls:
+                url, download = downloads.get()
+                if not download:
+                    continue
+                audio, audio_path = download
+                try:
+                    print(f"\nProcessing URL: {url}")
+                    
+                    # Create output path for transcript
+                    transcript_path = audio_path.with_suffix(".txt")
+                    
+                    # Transcribe audio
+                    transcript = transcriber.transcribe(audio, transcript_path)
+                    if transcript:
+                        print("\nTranscription completed successfully!")
+                        print("\nTranscript preview:")
+                        print(transcript[:500] + "..." if len(transcript) > 500 else transcript)
+                finally:
+                    # Drop the samples before freeing the slot for the next decode
+                    del download, audio
+                    decode_slots.release()
+        finally:
+            # On errors or Ctrl+C, stop the workers instead of leaving them
+            # blocked, which would keep the interpreter from exiting
+            downloader.cancel()
+            executor.shutdown(wait=False, cancel_futures=True)
             
     except FileNotFoundError:
-        print("Error: url.txt file not found. Please create a url.txt file with the YouTube URL.")
+        print("Error: url.txt file not found. Please create a url.txt file with the YouTube URL(s).")
     except Exception as e:
         print(f"An error occurred: {str(e)}")
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main() 
@@ -1,16 +1,44 @@
 from youtube_transcript_api import YouTubeTranscriptApi
 from youtube_transcript_api.formatters import TextFormatter
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import Optional
-import re
+import asyncio
 import os
 from dotenv import load_dotenv
-import requests
+import httpx
 import json
+import tiktoken
+from youtube_utils import get_video_id
 
 # Load environment variables
 load_dotenv()
 
+# Transcript requests are network-bound, so several can run at once
+MAX_FETCH_WORKERS = 8
+
+# Long transcripts are summarized in overlapping chunks of this many tokens
+CHUNK_TOKENS = 3000
+CHUNK_OVERLAP_TOKENS = 200
+
+# Output budget for each per-chunk (partial) analysis. Partials are merged in
+# groups of at most CHUNK_TOKENS so the final prompt stays bounded.
+PARTIAL_MAX_TOKENS = 600
+FINAL_MAX_TOKENS = 4000
+
+# Deepseek requests in flight at once, shared across chunks and videos
+MAX_CONCURRENT_REQUESTS = 8
+
+# Shared instructions for the analysis prompts
+ANALYSIS_FORMAT = """a JSON object with these keys:
+- "abstract": a brief abstract (2-3 sentences), as a string
+- "key_concepts": the key concepts, as an array of strings
+- "category": the category of the topic, as a string
+- "summary": a detailed summary ({summary_length}), as a string
+
+Please provide the analysis in the same language as the transcript ({language}).
+"""
+
 class TranscriptFetcher:
     """Handles fetching transcripts from YouTube videos."""
     
@@ -21,25 +49,36 @@ class TranscriptFetcher:
         self.deepseek_api_key = os.getenv('DEEPSEEK_API_KEY')
         if not self.deepseek_api_key:
             raise ValueError("DEEPSEEK_API_KEY not found in .env file")
+        # One keep-alive HTTP/2 connection is shared by all summary requests
+        self.client = httpx.AsyncClient(http2=True, timeout=120)
+        # Created on first use: before Python 3.10 a Semaphore binds to the
+        # event loop current at construction, which is not asyncio.run()'s
+        self._request_limit = None
+        self._request_limit_loop = None
+    
+    async def aclose(self) -> None:
+        """Close the HTTP client used for summary requests."""
+        await self.client.aclose()
+    
+    def _get_request_limit(self) -> asyncio.Semaphore:
+        """Return the request semaphore for the running event loop."""
+        loop = asyncio.get_running_loop()
+        if self._request_limit_loop is not loop:
+            self._request_limit = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+            self._request_limit_loop = loop
+        return self._request_limit
     
     def get_video_id(self, url: str) -> str:
         """Extract video ID from YouTube URL."""
-        patterns = [
-            r'(?:v=|/)([0-9A-Za-z_-]{11}).*',
-            r'youtu\.be/([0-9A-Za-z_-]{11})',
-        ]
-        
-        for pattern in patterns:
-            match = re.search(pattern, url)
-            if match:
-                return match.group(1)
-        
-        raise ValueError("Invalid YouTube URL format")
+        return get_video_id(url)
     
     def fetch_transcript(self, url: str, output_path: Optional[Path] = None) -> Optional[tuple[str, str]]:
         """
         Fetch transcript from YouTube video.
         
+        If output_path already holds a valid saved transcript, it is returned
+        without contacting YouTube; a malformed one is fetched again.
+        
         Args:
             url: YouTube video URL
             output_path: Optional path to save transcript
@@ -48,6 +87,13 @@ class TranscriptFetcher:
             Tuple of (transcript text, language code) or None if failed
         """
         try:
+            if output_path and output_path.exists():
+                header, _, formatted_transcript = output_path.read_text(encoding="utf-8").partition("\n\n")
+                if header.startswith("Language: ") and formatted_transcript:
+                    print(f"Using saved transcript: {output_path}")
+                    return formatted_transcript, header[len("Language: "):]
+                print(f"Ignoring malformed saved transcript: {output_path}")
+            
             video_id = self.get_video_id(url)
             print(f"Fetching transcript for video ID: {video_id}")
             
@@ -89,49 +135,141 @@ class TranscriptFetcher:
             print("3. Try using a different video URL")
             return None
     
-    def summarize_text(self, text: str, language: str) -> dict:
+    async def summarize_text(self, text: str, language: str, output_path: Optional[Path] = None) -> dict:
         """
         Summarize text using Deepseek API.
         
+        Long transcripts are split into overlapping chunks that are analyzed in
+        parallel with a small output budget. The partial analyses are merged in
+        groups until they fit in one prompt, then combined by a final request.
+        
         Args:
             text: Text to summarize
             language: Language code of the transcript
+            output_path: Optional path the raw final response is streamed to as it arrives
             
         Returns:
             Dictionary containing summary components
         """
-        headers = {
-            'Authorization': f'Bearer {self.deepseek_api_key}',
-            'Content-Type': 'application/json'
-        }
-        
-        # Adjust prompt based on language
-        prompt = f"""Please analyze the following transcript in {language} and provide:
-1. A brief abstract (2-3 sentences)
-2. Key concepts (bullet points)
-3. Category of the topic
-4. A detailed summary (4-5 paragraphs)
-
-Please provide the analysis in the same language as the transcript ({language}).
+        try:
+            chunks = self._split_text(text)
+            if len(chunks) > 1:
+                print(f"Transcript split into {len(chunks)} chunks")
+                partial_analyses = await asyncio.gather(*[
+                    self._complete(
+                        self._build_prompt(chunk, language, is_excerpt=True),
+                        max_tokens=PARTIAL_MAX_TOKENS
+                    )
+                    for chunk in chunks
+                ])
+                # Merge partials hierarchically until they fit in one prompt
+                while len(partial_analyses) > 1 and self._count_tokens(partial_analyses) > CHUNK_TOKENS:
+                    groups = self._group_by_tokens(partial_analyses)
+                    print(f"Merging {len(partial_analyses)} partial analyses into {len(groups)}")
+                    partial_analyses = await asyncio.gather(*[
+                        self._complete(
+                            self._build_reduce_prompt(group, language, is_final=False),
+                            max_tokens=PARTIAL_MAX_TOKENS
+                        )
+                        for group in groups
+                    ])
+                prompt = self._build_reduce_prompt(partial_analyses, language)
+            else:
+                prompt = self._build_prompt(text, language)
+            
+            content = await self._complete(prompt, output_path)
+            
+            return self._validate_analysis(json.loads(content))
+            
+        except Exception as e:
+            print(f"Error in summarization: {str(e)}")
+            if hasattr(e, 'response'):
+                print(f"API Response: {e.response.text}")
+            return None
 
-Format your response exactly like this:
-ABSTRACT:
-(your abstract here)
+    def _validate_analysis(self, analysis) -> dict:
+        """Check that a parsed analysis has the expected keys and types."""
+        if not isinstance(analysis, dict):
+            raise ValueError(f"Expected a JSON object, got {type(analysis).__name__}")
+        for key in ('abstract', 'category', 'summary'):
+            if not isinstance(analysis.get(key), str):
+                raise ValueError(f"Expected '{key}' to be a string")
+        key_concepts = analysis.get('key_concepts')
+        if not isinstance(key_concepts, list) or not all(isinstance(concept, str) for concept in key_concepts):
+            raise ValueError("Expected 'key_concepts' to be an array of strings")
+        return analysis
 
-KEY CONCEPTS:
-• (concept 1)
-• (concept 2)
-...
+    def _split_text(self, text: str) -> list[str]:
+        """Split text into overlapping chunks of at most CHUNK_TOKENS tokens."""
+        # cl100k_base only approximates Deepseek's tokenizer, which is close
+        # enough for sizing requests
+        encoding = tiktoken.get_encoding("cl100k_base")
+        tokens = encoding.encode(text)
+        if len(tokens) <= CHUNK_TOKENS:
+            return [text]
+        
+        step = CHUNK_TOKENS - CHUNK_OVERLAP_TOKENS
+        return [
+            encoding.decode(tokens[start:start + CHUNK_TOKENS])
+            for start in range(0, len(tokens) - CHUNK_OVERLAP_TOKENS, step)
+        ]
 
-CATEGORY:
-(category here)
+    def _count_tokens(self, texts: list[str]) -> int:
+        """Approximate the total token count of texts."""
+        encoding = tiktoken.get_encoding("cl100k_base")
+        return sum(len(encoding.encode(text)) for text in texts)
 
-SUMMARY:
-(your detailed summary here)
+    def _group_by_tokens(self, texts: list[str]) -> list[list[str]]:
+        """Group consecutive texts so each group has at most CHUNK_TOKENS tokens."""
+        groups, current, current_tokens = [], [], 0
+        for text in texts:
+            tokens = self._count_tokens([text])
+            # Always pair at least two texts so every merge round shrinks the list
+            if len(current) >= 2 and current_tokens + tokens > CHUNK_TOKENS:
+                groups.append(current)
+                current, current_tokens = [], 0
+            current.append(text)
+            current_tokens += tokens
+        if len(current) == 1 and groups:
+            groups[-1].append(current[0])
+        elif current:
+            groups.append(current)
+        return groups
 
+    def _build_prompt(self, text: str, language: str, is_excerpt: bool = False) -> str:
+        """Build the analysis prompt for a transcript or transcript excerpt."""
+        source = "excerpt from a longer transcript" if is_excerpt else "transcript"
+        summary_length = "one short paragraph" if is_excerpt else "4-5 paragraphs"
+        # Adjust prompt based on language
+        return f"""Please analyze the following {source} in {language} and provide:
+{ANALYSIS_FORMAT.format(language=language, summary_length=summary_length)}
 Transcript:
 {text}
 """
+
+    def _build_reduce_prompt(self, partial_analyses: list[str], language: str, is_final: bool = True) -> str:
+        """Build the prompt that merges per-chunk analyses into one."""
+        combined = "\n\n---\n\n".join(partial_analyses)
+        scope = "the whole transcript" if is_final else "these consecutive parts"
+        summary_length = "4-5 paragraphs" if is_final else "one short paragraph"
+        return f"""The following are analyses of consecutive parts of a single transcript in {language}.
+Combine them into one analysis of {scope} and provide:
+{ANALYSIS_FORMAT.format(language=language, summary_length=summary_length)}
+Partial analyses:
+{combined}
+"""
+
+    async def _complete(
+        self,
+        prompt: str,
+        output_path: Optional[Path] = None,
+        max_tokens: int = FINAL_MAX_TOKENS
+    ) -> str:
+        """Send a prompt to the Deepseek chat API and return the streamed response text."""
+        headers = {
+            'Authorization': f'Bearer {self.deepseek_api_key}',
+            'Content-Type': 'application/json'
+        }
         
         data = {
             'model': 'deepseek-chat',
@@ -142,104 +280,165 @@ Transcript:
                 }
             ],
             'temperature': 0.7,
-            'max_tokens': 4000
+            'max_tokens': max_tokens,
+            'response_format': {'type': 'json_object'},
+            'stream': True
         }
 
-        try:
-            response = requests.post(
+        async with self._get_request_limit():
+            async with self.client.stream(
+                'POST',
                 'https://api.deepseek.com/v1/chat/completions',
                 headers=headers,
                 json=data
-            )
-            response.raise_for_status()
-            
-            result = response.json()
-            content = result['choices'][0]['message']['content']
-            
-            sections = content.split('\n\n')
-            response_dict = {}
-            
-            for section in sections:
-                if section.startswith('ABSTRACT:'):
-                    response_dict['abstract'] = section.replace('ABSTRACT:', '').strip()
-                elif section.startswith('KEY CONCEPTS:'):
-                    concepts = [line.strip('• ').strip() for line in section.split('\n')[1:] if line.strip()]
-                    response_dict['key_concepts'] = concepts
-                elif section.startswith('CATEGORY:'):
-                    response_dict['category'] = section.replace('CATEGORY:', '').strip()
-                elif section.startswith('SUMMARY:'):
-                    response_dict['summary'] = section.replace('SUMMARY:', '').strip()
-            
-            return response_dict
+            ) as response:
+                if response.is_error:
+                    # Load the error body so it can be reported
+                    await response.aread()
+                response.raise_for_status()
+                
+                return await self._read_stream(response, output_path)
+
+    async def _read_stream(self, response: httpx.Response, output_path: Optional[Path] = None) -> str:
+        """Collect a streamed (SSE) completion, writing each token to output_path as it arrives."""
+        chunks = []
+        output_file = open(output_path, "w", encoding="utf-8") if output_path else None
+        try:
+            async for line in response.aiter_lines():
+                # Skip keep-alive comments and blank separator lines
+                if not line.startswith('data: '):
+                    continue
+                payload = line[len('data: '):]
+                if payload == '[DONE]':
+                    break
+                delta = json.loads(payload)['choices'][0]['delta'].get('content') or ''
+                chunks.append(delta)
+                if output_file:
+                    output_file.write(delta)
+                    output_file.flush()
+        finally:
+            if output_file:
+                output_file.close()
+        return ''.join(chunks)
+
+    async def process_transcript(self, transcript_data: tuple[str, str], summary_path: Path) -> Optional[dict]:
+        """
+        Generate the analysis of a transcript and save it to summary_path.
+        
+        Returns:
+            The analysis sections, or None if it could not be generated or saved
+        """
+        transcript, language = transcript_data
+        
+        # The raw response is streamed into a side file so a failed or
+        # truncated reply never overwrites an existing analysis
+        partial_path = summary_path.with_suffix(".partial")
+        summary_data = await self.summarize_text(transcript, language, partial_path)
+        
+        if not summary_data:
+            return None
+        
+        try:
+            # Build the whole report first so it is written in one call
+            parts = [
+                f"=== TRANSCRIPT ANALYSIS (Language: {language}) ===\n\n",
+                "ABSTRACT:\n",
+                summary_data.get('abstract', 'Not available'),
+                "\n\nKEY CONCEPTS:\n",
+                *(f"• {concept}\n" for concept in summary_data.get('key_concepts', [])),
+                f"\nCATEGORY:\n{summary_data.get('category', 'Not available')}\n",
+                "\nDETAILED SUMMARY:\n",
+                summary_data.get('summary', 'Not available'),
+            ]
+            with open(summary_path, "w", encoding="utf-8") as f:
+                f.write("".join(parts))
+            partial_path.unlink(missing_ok=True)
+            return summary_data
             
         except Exception as e:
-            print(f"Error in summarization: {str(e)}")
-            if hasattr(e, 'response'):
-                print(f"API Response: {e.response.text}")
+            print(f"Error saving summary to {summary_path}: {str(e)}")
             return None
 
-    def process_transcript(self, transcript_data: tuple[str, str], summary_path: Path) -> None:
-        """Process transcript and save summary."""
-        transcript, language = transcript_data
+    def print_summary(self, summary_data: dict) -> None:
+        """Print the analysis sections shown on the console."""
+        print("\nAnalysis Results:")
+        print("\nAbstract:")
+        print(summary_data.get('abstract', 'Not available'))
+        print("\nKey Concepts:")
+        for concept in summary_data.get('key_concepts', []):
+            print(f"• {concept}")
+        print(f"\nCategory: {summary_data.get('category', 'Not available')}")
+        print("\nDetailed summary has been saved to the output file.")
+
+async def process_transcripts(fetcher: TranscriptFetcher, jobs: list[tuple[str, tuple[str, str], Path]]) -> None:
+    """Summarize all fetched transcripts concurrently, then report them in URL order."""
+    try:
+        print(f"\nGenerating {len(jobs)} summary(ies) using Deepseek AI...")
+        results = await asyncio.gather(*[
+            fetcher.process_transcript(transcript_data, summary_path)
+            for _, transcript_data, summary_path in jobs
+        ])
+    finally:
+        await fetcher.aclose()
+    
+    for (url, (_, language), summary_path), summary_data in zip(jobs, results):
+        print(f"\n=== {url} ===")
         print(f"\nDetected language: {language}")
-        print("\nGenerating summary using Deepseek AI...")
-        
-        summary_data = self.summarize_text(transcript, language)
-        
         if summary_data:
-            try:
-                with open(summary_path, "w", encoding="utf-8") as f:
-                    f.write(f"=== TRANSCRIPT ANALYSIS (Language: {language}) ===\n\n")
-                    f.write("ABSTRACT:\n")
-                    f.write(summary_data.get('abstract', 'Not available'))
-                    f.write("\n\nKEY CONCEPTS:\n")
-                    for concept in summary_data.get('key_concepts', []):
-                        f.write(f"• {concept}\n")
-                    f.write(f"\nCATEGORY:\n{summary_data.get('category', 'Not available')}\n")
-                    f.write("\nDETAILED SUMMARY:\n")
-                    f.write(summary_data.get('summary', 'Not available'))
-                
-                print("\nAnalysis Results:")
-                print("\nAbstract:")
-                print(summary_data.get('abstract', 'Not available'))
-                print("\nKey Concepts:")
-                for concept in summary_data.get('key_concepts', []):
-                    print(f"• {concept}")
-                print(f"\nCategory: {summary_data.get('category', 'Not available')}")
-                print("\nDetailed summary has been saved to the output file.")
-                
-            except Exception as e:
-                print(f"Error saving summary: {str(e)}")
+            fetcher.print_summary(summary_data)
+            print(f"Saved to: {summary_path}")
         else:
             print("Failed to generate summary.")
+            partial_path = summary_path.with_suffix(".partial")
+            if partial_path.exists():
+                print(f"Raw response kept in: {partial_path}")
 
 def main():
     """Main function to run the transcript fetching process."""
     try:
+        # Read URLs from url.txt, one per line
         with open('url.txt', 'r') as file:
-            url = file.read().strip()
+            urls = [line.strip() for line in file if line.strip()]
             
-        if not url:
+        if not urls:
             print("Error: url.txt is empty")
             return
             
-        print(f"Processing URL: {url}")
+        print(f"Processing {len(urls)} URL(s)")
         
         fetcher = TranscriptFetcher()
         
-        video_id = fetcher.get_video_id(url)
-        transcript_path = fetcher.output_dir / f"{video_id}_transcript.txt"
-        summary_path = fetcher.output_dir / f"{video_id}_analysis.txt"
+        # A malformed line only skips that URL, not the whole batch
+        valid_urls, video_ids = [], []
+        for url in urls:
+            try:
+                video_ids.append(fetcher.get_video_id(url))
+                valid_urls.append(url)
+            except ValueError as e:
+                print(f"Skipping {url}: {str(e)}")
+        urls = valid_urls
         
-        transcript_data = fetcher.fetch_transcript(url, transcript_path)
-        if transcript_data:
-            print("\nTranscript fetching completed successfully!")
-            fetcher.process_transcript(transcript_data, summary_path)
+        def fetch(url: str, video_id: str) -> Optional[tuple[str, str]]:
+            transcript_path = fetcher.output_dir / f"{video_id}_transcript.txt"
+            return fetcher.fetch_transcript(url, transcript_path)
+        
+        # Fetch all transcripts concurrently
+        with ThreadPoolExecutor(max_workers=MAX_FETCH_WORKERS) as executor:
+            results = list(executor.map(fetch, urls, video_ids))
+        
+        jobs = []
+        for url, video_id, transcript_data in zip(urls, video_ids, results):
+            if transcript_data:
+                print(f"\nTranscript fetching completed successfully for: {url}")
+                summary_path = fetcher.output_dir / f"{video_id}_analysis.txt"
+                jobs.append((url, transcript_data, summary_path))
+        
+        asyncio.run(process_transcripts(fetcher, jobs))
             
     except FileNotFoundError:
-        print("Error: url.txt file not found. Please create a url.txt file with the YouTube URL.")
+        print("Error: url.txt file not found. Please create a url.txt file with the YouTube URL(s).")
     except Exception as e:
         print(f"An error occurred: {str(e)}")
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
\ No newline at end of file
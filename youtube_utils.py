@@ -0,0 +1,12 @@
+import re
+
+# Matches the 11-character video ID in watch (?v=), embed/shorts and youtu.be URLs
+VIDEO_ID_PATTERN = re.compile(r'(?:v=|/)([0-9A-Za-z_-]{11})')
+
+def get_video_id(url: str) -> str:
+    """Extract video ID from YouTube URL."""
+    match = VIDEO_ID_PATTERN.search(url)
+    if match:
+        return match.group(1)
+    
+    raise ValueError("Invalid YouTube URL format")